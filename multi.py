@@ -1,10 +1,18 @@
 import os
 import re
+import time
 import random
+import hashlib
+import threading
+from array import array
+from bisect import bisect_left
 from collections import Counter
+from contextlib import contextmanager
 from dataclasses import dataclass
 from typing import List, Dict, Tuple, Optional
 
+import numpy as np
+import pandas as pd
 import streamlit as st
 
 # Optional but recommended for more robust PDF parsing
@@ -17,6 +25,13 @@ try:
 except Exception:
     PYMUPDF_AVAILABLE = False
 
+# File locking for the ticket ledger (POSIX); without it only threads are serialized
+try:
+    import fcntl
+    FCNTL_AVAILABLE = True
+except Exception:
+    FCNTL_AVAILABLE = False
+
 
 # =========================================================
 # CONFIG
@@ -36,6 +51,21 @@ HOT_SHARE_DEFAULT = 0.70
 COLD_SHARE_DEFAULT = 0.20
 MIX_SHARE_DEFAULT = 0.10
 
+# Upper limit for one batch (results are shown in a single virtualized table)
+MAX_TICKETS_COUNT = 10000
+
+# Historical hit-check: report the last draw where a ticket scored at least this many hits
+HIT_CHECK_MIN_HITS = 5
+
+# Persistent register of issued tickets (shared by all sessions / processes on this machine)
+LEDGER_FILENAME = "kupony_ledger.bin"
+LEDGER_RECORD_SIZE = 10          # one 80-bit ticket mask per record
+LEDGER_MIN_CAPACITY = 1_000_000  # Bloom filter is sized for at least this many tickets
+LEDGER_MAX_RETRIES = 50          # regenerate this many times before giving up on a duplicate
+
+# How often the background watcher checks wyniki.pdf for changes (seconds)
+PDF_WATCH_INTERVAL_SEC = 30
+
 
 # =========================================================
 # UI STYLE (light + blue)
@@ -117,12 +147,6 @@ section[data-testid="stSidebar"] {
     border-collapse: separate;
     border-spacing: 0 8px;
 }
-.mm-row {
-    background: rgba(255,255,255,0.9);
-    border: 1px solid rgba(0, 123, 255, 0.18);
-    border-radius: 14px;
-    padding: 10px 12px;
-}
 
 /* Mobile tweaks */
 @media (max-width: 640px) {
@@ -220,8 +244,10 @@ def _parse_draws_from_text(text: str) -> List[Draw]:
     return final_draws
 
 
-@st.cache_data(show_spinner=False)
-def load_draws_from_local_pdf(pdf_path: str) -> List[Draw]:
+def read_draws_from_pdf(pdf_path: str) -> List[Draw]:
+    """
+    Uncached on purpose: PdfWatcher calls this again whenever the file changes.
+    """
     # Try pdfplumber first
     text = ""
     try:
@@ -257,17 +283,114 @@ def compute_frequency(draws: List[Draw]) -> Counter:
     return c
 
 
+class OccurrenceIndex:
+    """
+    Per-number inverted index of draw positions.
+
+    Positions are chronological (0 = oldest draw) and stored as compact
+    unsigned int arrays, so appending a new draw never shifts existing data.
+    Public queries use "draws ago" like compute_last_seen (0 = most recent).
+    """
+
+    NEVER = 10**9
+
+    def __init__(self):
+        self._positions: Dict[int, array] = {n: array("I") for n in range(NUM_MIN, NUM_MAX + 1)}
+        self._max_gap: Dict[int, int] = {n: 0 for n in range(NUM_MIN, NUM_MAX + 1)}
+        self.total = 0
+
+    @classmethod
+    def from_draws(cls, draws: List[Draw]) -> "OccurrenceIndex":
+        """Build from a draws list ordered like read_draws_from_pdf (newest first)."""
+        idx = cls()
+        idx.extend(reversed(draws))
+        return idx
+
+    def append(self, draw: Draw) -> None:
+        """Add one draw that is newer than every draw already indexed."""
+        pos = self.total
+        for n in set(draw.numbers):
+            if not (NUM_MIN <= n <= NUM_MAX):
+                continue
+            occ = self._positions[n]
+            if occ:
+                gap = pos - occ[-1]
+                if gap > self._max_gap[n]:
+                    self._max_gap[n] = gap
+            occ.append(pos)
+        self.total += 1
+
+    def copy(self) -> "OccurrenceIndex":
+        idx = OccurrenceIndex()
+        idx._positions = {n: array("I", occ) for n, occ in self._positions.items()}
+        idx._max_gap = dict(self._max_gap)
+        idx.total = self.total
+        return idx
+
+    def extend(self, draws) -> None:
+        """Append draws given oldest first."""
+        for d in draws:
+            self.append(d)
+
+    def count(self, n: int) -> int:
+        return len(self._positions.get(n, ()))
+
+    def nth_previous(self, n: int, k: int = 1) -> int:
+        """
+        How many draws ago number n appeared for the k-th time counting back
+        (k=1 = last occurrence). NEVER if it has fewer than k occurrences.
+        """
+        occ = self._positions.get(n)
+        if not occ or k < 1 or k > len(occ):
+            return self.NEVER
+        return self.total - 1 - occ[-k]
+
+    def last_seen(self, n: int) -> int:
+        return self.nth_previous(n, 1)
+
+    def current_gap(self, n: int) -> int:
+        """Draws since the last occurrence (same as last_seen); NEVER if never seen."""
+        return self.last_seen(n)
+
+    def max_current_gap(self) -> int:
+        """Largest current gap among numbers seen at least once (1 if none)."""
+        oldest_last = min((occ[-1] for occ in self._positions.values() if occ), default=None)
+        if oldest_last is None:
+            return 1
+        return max(1, self.total - 1 - oldest_last)
+
+    def mean_gap(self, n: int) -> float:
+        """Average distance between consecutive occurrences (0.0 if fewer than 2)."""
+        occ = self._positions.get(n)
+        if not occ or len(occ) < 2:
+            return 0.0
+        return (occ[-1] - occ[0]) / (len(occ) - 1)
+
+    def max_gap(self, n: int) -> int:
+        """Longest closed distance between consecutive occurrences (0 if fewer than 2)."""
+        return self._max_gap.get(n, 0)
+
+    def count_between(self, n: int, newest_ago: int, oldest_ago: int) -> int:
+        """Occurrences of n between newest_ago and oldest_ago draws ago (both inclusive)."""
+        occ = self._positions.get(n)
+        if not occ or oldest_ago < newest_ago:
+            return 0
+        lo = max(0, self.total - 1 - oldest_ago)
+        hi = self.total - 1 - newest_ago
+        if hi < lo:
+            return 0
+        return bisect_left(occ, hi + 1) - bisect_left(occ, lo)
+
+    def last_seen_map(self) -> Dict[int, int]:
+        return {n: self.last_seen(n) for n in range(NUM_MIN, NUM_MAX + 1)}
+
+
 def compute_last_seen(draws: List[Draw]) -> Dict[int, int]:
     """
     Return map number -> index of last occurrence in draws list (0 = most recent).
     If never seen, value = big number.
     """
-    last = {n: 10**9 for n in range(NUM_MIN, NUM_MAX + 1)}
-    for idx, d in enumerate(draws):
-        for n in d.numbers:
-            if last.get(n, 10**9) == 10**9:
-                last[n] = idx
-    return last
+    return OccurrenceIndex.from_draws(draws).last_seen_map()
 
 
 def build_groups(freq: Counter, hot_size: int, cold_size: int) -> Tuple[List[int], List[int]]:
@@ -282,6 +405,396 @@ def build_groups(freq: Counter, hot_size: int, cold_size: int) -> Tuple[List[int
     return hot, cold
 
 
+# =========================================================
+# HIT CHECK (tickets vs. full history, bitmask AND + popcount)
+# =========================================================
+_POPCOUNT_LUT = np.array([bin(i).count("1") for i in range(256)], dtype=np.uint8)
+
+
+def pack_numbers(rows: List[List[int]]) -> np.ndarray:
+    """
+    Pack each row of numbers (NUM_MIN..NUM_MAX) into an 80-bit mask stored as
+    two little-endian uint64 words -> array of shape (len(rows), 2).
+    """
+    width = NUM_MAX - NUM_MIN + 1
+    bits = np.zeros((len(rows), 128), dtype=bool)
+    lens = [len(r) for r in rows]
+    if sum(lens):
+        row_idx = np.repeat(np.arange(len(rows)), lens)
+        cols = np.fromiter((n for r in rows for n in r), dtype=np.int64, count=sum(lens)) - NUM_MIN
+        ok = (cols >= 0) & (cols < width)
+        bits[row_idx[ok], cols[ok]] = True
+    return np.packbits(bits, axis=1, bitorder="little").view("<u8")
+
+
+def _popcount(x: np.ndarray, out: Optional[np.ndarray] = None) -> np.ndarray:
+    """Per-element bit count as uint8 (numpy >= 2.0 ufunc, byte lookup table otherwise)."""
+    if hasattr(np, "bitwise_count"):
+        return np.bitwise_count(x, out=out)
+    as_bytes = np.ascontiguousarray(x).view(np.uint8).reshape(x.shape + (x.itemsize,))
+    return _POPCOUNT_LUT[as_bytes].sum(axis=-1, dtype=np.uint8, out=out)
+
+
+@dataclass
+class HitCheckResult:
+    histogram: np.ndarray  # (tickets, PICK_COUNT + 1): how many draws gave k hits
+    last_big_hit: np.ndarray  # (tickets,): draws-ago index of latest draw with >= min_hits, -1 if never
+    min_hits: int
+
+
+def hit_check(
+    tickets: List[List[int]],
+    packed_draws: np.ndarray,
+    min_hits: int = HIT_CHECK_MIN_HITS,
+    chunk_cells: int = 1 << 20,
+) -> HitCheckResult:
+    """
+    Score every ticket against every past draw (packed_draws from pack_numbers,
+    newest first). Tickets are processed in chunks of about chunk_cells
+    ticket x draw pairs, reusing the same scratch buffers to stay cache-friendly.
+    """
+    bins = PICK_COUNT + 1
+    packed_tickets = pack_numbers(tickets)
+    n_tickets, n_draws = len(packed_tickets), len(packed_draws)
+
+    histogram = np.zeros((n_tickets, bins), dtype=np.int64)
+    last_big_hit = np.full(n_tickets, -1, dtype=np.int64)
+    if n_tickets == 0 or n_draws == 0:
+        return HitCheckResult(histogram, last_big_hit, min_hits)
+
+    # The high word only carries numbers 65..80, so 16 bits are enough
+    lo = np.ascontiguousarray(packed_draws[:, 0])
+    hi = packed_draws[:, 1].astype(np.uint16)
+    t_lo = packed_tickets[:, 0].copy()
+    t_hi = packed_tickets[:, 1].astype(np.uint16)
+
+    step = max(1, min(n_tickets, chunk_cells // n_draws))
+    and_lo = np.empty((step, n_draws), dtype=np.uint64)
+    and_hi = np.empty((step, n_draws), dtype=np.uint16)
+    hits = np.empty((step, n_draws), dtype=np.uint8)
+    hits_hi = np.empty((step, n_draws), dtype=np.uint8)
+
+    for start in range(0, n_tickets, step):
+        rows = min(step, n_tickets - start)
+        h = hits[:rows]
+        np.bitwise_and(t_lo[start:start + rows, None], lo, out=and_lo[:rows])
+        np.bitwise_and(t_hi[start:start + rows, None], hi, out=and_hi[:rows])
+        _popcount(and_lo[:rows], out=h)
+        h += _popcount(and_hi[:rows], out=hits_hi[:rows])
+        np.minimum(h, bins - 1, out=h)
+
+        for i in range(rows):
+            histogram[start + i] = np.bincount(h[i], minlength=bins)
+
+        big = h >= min_hits
+        last_big_hit[start:start + rows] = np.where(big.any(axis=1), big.argmax(axis=1), -1)
+
+    return HitCheckResult(histogram, last_big_hit, min_hits)
+
+
+# =========================================================
+# TICKET LEDGER (append-only file + Bloom filter)
+# =========================================================
+_U64 = np.uint64
+
+
+def _mix64(z: np.ndarray) -> np.ndarray:
+    """splitmix64 finalizer on a uint64 array (wrapping arithmetic)."""
+    z = (z ^ (z >> _U64(30))) * _U64(0xBF58476D1CE4E5B9)
+    z = (z ^ (z >> _U64(27))) * _U64(0x94D049BB133111EB)
+    return z ^ (z >> _U64(31))
+
+
+class BloomFilter:
+    """
+    Bit-packed Bloom filter over 80-bit masks given as (lo, hi) uint64 arrays.
+    ~10 bits per entry and 7 probes: about 1% false positives at capacity.
+    """
+
+    PROBES = 7
+    BITS_PER_ENTRY = 10
+
+    def __init__(self, capacity: int):
+        self.capacity = capacity
+        m = 1 << max(16, (capacity * self.BITS_PER_ENTRY - 1).bit_length())
+        self._mask = _U64(m - 1)
+        self._bits = np.zeros(m // 8, dtype=np.uint8)
+
+    def _positions(self, lo: np.ndarray, hi: np.ndarray) -> np.ndarray:
+        h1 = _mix64(lo ^ (hi * _U64(0x9E3779B97F4A7C15)))
+        h2 = _mix64(h1 ^ _U64(0xD6E8FEB86659FD93)) | _U64(1)
+        probes = np.arange(self.PROBES, dtype=np.uint64)
+        return (h1[:, None] + probes * h2[:, None]) & self._mask
+
+    def add(self, lo: np.ndarray, hi: np.ndarray) -> None:
+        pos = self._positions(lo, hi).ravel()
+        np.bitwise_or.at(self._bits, pos >> _U64(3), (1 << (pos & _U64(7))).astype(np.uint8))
+
+    def contains(self, lo: np.ndarray, hi: np.ndarray) -> np.ndarray:
+        pos = self._positions(lo, hi)
+        return ((self._bits[pos >> _U64(3)] >> (pos & _U64(7)).astype(np.uint8)) & 1).all(axis=1)
+
+
+def _records_to_words(buf: bytes) -> Tuple[np.ndarray, np.ndarray]:
+    """Split raw ledger records into (lo, hi) uint64 words, matching pack_numbers."""
+    rec = np.frombuffer(buf, dtype=np.uint8).reshape(-1, LEDGER_RECORD_SIZE)
+    padded = np.zeros((len(rec), 16), dtype=np.uint8)
+    padded[:, :LEDGER_RECORD_SIZE] = rec
+    words = padded.view("<u8")
+    return words[:, 0].copy(), words[:, 1].copy()
+
+
+class TicketLedger:
+    """
+    Append-only on-disk register of issued tickets.
+    - Each ticket is one LEDGER_RECORD_SIZE-byte record (its 80-bit pack_numbers mask).
+    - Membership is answered by an in-memory Bloom filter, so a rare false positive
+      only means a fresh ticket gets regenerated; issued tickets are never repeated.
+    - Writers on one machine serialize through flock (and a thread lock inside the
+      process); records appended by other writers are picked up on the next call.
+    """
+
+    def __init__(self, path: str, capacity: int = LEDGER_MIN_CAPACITY):
+        self.path = path
+        self._fh = open(path, "a+b")
+        self._thread_lock = threading.Lock()
+        self._offset = 0
+        self.count = 0
+        self._bloom = BloomFilter(max(capacity, 2 * self._file_records()))
+        with self._locked():
+            self._sync()
+
+    def _file_records(self) -> int:
+        return os.fstat(self._fh.fileno()).st_size // LEDGER_RECORD_SIZE
+
+    @contextmanager
+    def _locked(self):
+        with self._thread_lock:
+            if FCNTL_AVAILABLE:
+                fcntl.flock(self._fh.fileno(), fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                if FCNTL_AVAILABLE:
+                    fcntl.flock(self._fh.fileno(), fcntl.LOCK_UN)
+
+    def _sync(self) -> None:
+        """Load records appended since the last call (caller holds the lock)."""
+        size = os.fstat(self._fh.fileno()).st_size
+        if size % LEDGER_RECORD_SIZE:
+            # Torn write from a crashed writer: drop the partial record
+            size -= size % LEDGER_RECORD_SIZE
+            self._fh.truncate(size)
+
+        # Checked before the early return: try_issue advances _offset past our own
+        # appends, so this is also where the filter grows for tickets issued here.
+        new_count = size // LEDGER_RECORD_SIZE
+        if new_count > self._bloom.capacity:
+            # Past capacity the false-positive rate climbs; rebuild twice as large
+            self._bloom = BloomFilter(2 * new_count)
+            self._offset = 0
+        if size <= self._offset:
+            return
+
+        self._fh.seek(self._offset)
+        chunk_bytes = LEDGER_RECORD_SIZE * (1 << 20)
+        while self._offset < size:
+            buf = self._fh.read(min(chunk_bytes, size - self._offset))
+            self._bloom.add(*_records_to_words(buf))
+            self._offset += len(buf)
+        self.count = new_count
+
+    def contains(self, ticket: List[int]) -> bool:
+        packed = pack_numbers([ticket])
+        with self._locked():
+            self._sync()
+            return bool(self._bloom.contains(packed[:, 0], packed[:, 1])[0])
+
+    def try_issue(self, ticket: List[int]) -> bool:
+        """Record the ticket unless it was already issued. Returns True if recorded."""
+        packed = pack_numbers([ticket])
+        lo, hi = packed[:, 0], packed[:, 1]
+        with self._locked():
+            self._sync()
+            if self._bloom.contains(lo, hi)[0]:
+                return False
+            self._fh.seek(0, os.SEEK_END)
+            self._fh.write(packed.tobytes()[:LEDGER_RECORD_SIZE])
+            self._fh.flush()
+            self._bloom.add(lo, hi)
+            self._offset += LEDGER_RECORD_SIZE
+            self.count += 1
+            return True
+
+    def close(self) -> None:
+        self._fh.close()
+
+
+@st.cache_resource(show_spinner=False)
+def get_ticket_ledger(path: str) -> TicketLedger:
+    """One ledger handle per path, shared by all sessions of this server process."""
+    return TicketLedger(path)
+
+
+# =========================================================
+# DATA WATCHER (background reload of wyniki.pdf)
+# =========================================================
+@dataclass
+class DataSnapshot:
+    version: str        # sha256 of the PDF contents
+    loaded_at: float    # time.time() when the snapshot was built
+    draws: List[Draw]
+    freq: Counter
+    occ_index: OccurrenceIndex
+    packed_draws: np.ndarray  # pack_numbers(draws), for hit_check
+
+
+def _file_sha256(path: str) -> str:
+    h = hashlib.sha256()
+    with open(path, "rb") as fh:
+        for chunk in iter(lambda: fh.read(1 << 20), b""):
+            h.update(chunk)
+    return h.hexdigest()
+
+
+def build_snapshot(
+    pdf_path: str,
+    version: Optional[str] = None,
+    prev: Optional[DataSnapshot] = None,
+) -> DataSnapshot:
+    """
+    Parse the PDF into a new snapshot. If the new draws only add newer draws on
+    top of prev.draws, the analytics are extended from prev instead of rebuilt.
+    """
+    version = version or _file_sha256(pdf_path)
+    draws = read_draws_from_pdf(pdf_path)
+
+    added = len(draws) - len(prev.draws) if prev is not None else -1
+    if prev is not None and added >= 0 and draws[added:] == prev.draws:
+        new_only = draws[:added]
+        occ_index = prev.occ_index.copy()  # prev is still being served
+        occ_index.extend(reversed(new_only))
+        return DataSnapshot(
+            version=version,
+            loaded_at=time.time(),
+            draws=draws,
+            freq=prev.freq + compute_frequency(new_only),
+            occ_index=occ_index,
+            packed_draws=np.vstack([pack_numbers([d.numbers for d in new_only]), prev.packed_draws]),
+        )
+
+    return DataSnapshot(
+        version=version,
+        loaded_at=time.time(),
+        draws=draws,
+        freq=compute_frequency(draws),
+        occ_index=OccurrenceIndex.from_draws(draws),
+        packed_draws=pack_numbers([d.numbers for d in draws]),
+    )
+
+
+class PdfWatcher:
+    """
+    Keeps the current DataSnapshot for one PDF and refreshes it in a daemon thread.
+    - Polls mtime/size every interval; only hashes the file when those change.
+    - Re-parses off the UI thread and swaps the snapshot in one assignment, so
+      sessions keep reading the previous version until the new one is complete.
+    - A failed re-parse keeps the old snapshot and records last_error.
+    """
+
+    def __init__(self, pdf_path: str, interval: float = PDF_WATCH_INTERVAL_SEC):
+        self.pdf_path = pdf_path
+        self.interval = interval
+        self.last_error: Optional[str] = None
+        self._parse_error: Optional[str] = None  # error for the file at _stat_key, if it failed
+        self._snapshot: Optional[DataSnapshot] = None
+        self._stat_key: Optional[Tuple[float, int]] = None
+        self._build_lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    @property
+    def snapshot(self) -> Optional[DataSnapshot]:
+        return self._snapshot
+
+    def _stat(self) -> Tuple[float, int]:
+        stt = os.stat(self.pdf_path)
+        return stt.st_mtime, stt.st_size
+
+    def load_now(self) -> DataSnapshot:
+        """Synchronous load (first request only); concurrent callers share one parse."""
+        with self._build_lock:
+            if self._snapshot is None:
+                stat_key = self._stat()
+                self._snapshot = build_snapshot(self.pdf_path)
+                self._stat_key = stat_key
+                self._parse_error = self.last_error = None
+            return self._snapshot
+
+    def check(self) -> bool:
+        """Reload if the PDF changed. Returns True when a new snapshot was swapped in."""
+        try:
+            stat_key = self._stat()
+        except OSError as e:
+            self.last_error = str(e)
+            return False
+        # Readable again: only a failed parse of this same file keeps the warning
+        self.last_error = self._parse_error
+        if stat_key == self._stat_key:
+            return False
+
+        with self._build_lock:
+            try:
+                version = _file_sha256(self.pdf_path)
+                current = self._snapshot
+                if current is not None and version == current.version:
+                    self._stat_key = stat_key
+                    self._parse_error = self.last_error = None
+                    return False
+                new_snapshot = build_snapshot(self.pdf_path, version=version, prev=current)
+            except Exception as e:
+                # Remember the stat so a broken file is not re-parsed every tick
+                self._stat_key = stat_key
+                self._parse_error = self.last_error = str(e)
+                return False
+            self._snapshot = new_snapshot
+            self._stat_key = stat_key
+            self._parse_error = self.last_error = None
+            return True
+
+    def start(self) -> None:
+        if self._thread is not None and self._thread.is_alive():
+            return
+        self._thread = threading.Thread(target=self._run, name="mm-pdf-watcher", daemon=True)
+        self._thread.start()
+
+    def stop(self) -> None:
+        self._stop.set()
+
+    def _run(self) -> None:
+        while not self._stop.wait(self.interval):
+            self.check()
+
+
+@st.cache_resource(show_spinner=False)
+def get_pdf_watcher(pdf_path: str) -> PdfWatcher:
+    """One watcher per PDF path, shared by all sessions of this server process."""
+    watcher = PdfWatcher(pdf_path)
+    watcher.start()
+    return watcher
+
+
+def format_age(seconds: float) -> str:
+    seconds = max(0, int(seconds))
+    if seconds < 60:
+        return f"{seconds} s"
+    if seconds < 3600:
+        return f"{seconds // 60} min"
+    if seconds < 86400:
+        return f"{seconds // 3600} h"
+    return f"{seconds // 86400} d"
+
+
 # =========================================================
 # GENERATION LOGIC
 # =========================================================
@@ -316,7 +829,7 @@ def generate_ticket_base(
     hot: List[int],
     cold: List[int],
     freq: Counter,
-    last_seen: Dict[int, int],
+    occ_index: OccurrenceIndex,
     hot_share: float,
     cold_share: float,
     mix_share: float,
@@ -333,7 +846,7 @@ def generate_ticket_base(
     # freq_weight: emphasize frequent numbers
     # overdue_weight: emphasize numbers not seen recently (bigger index)
     max_freq = max(freq.values()) if freq else 1
-    max_last = max([v for v in last_seen.values() if v < 10**9] + [1])
+    max_last = occ_index.max_current_gap()
 
     weights_hot = {}
     weights_cold = {}
@@ -342,8 +855,8 @@ def generate_ticket_base(
     for n in all_nums:
         f = freq.get(n, 0)
         f_norm = (f / max_freq) if max_freq else 0.0
-        ls = last_seen.get(n, 10**9)
-        if ls >= 10**9:
+        ls = occ_index.current_gap(n)
+        if ls >= OccurrenceIndex.NEVER:
             overdue_norm = 1.0
         else:
             overdue_norm = min(1.0, (ls / max_last) if max_last else 0.0)
@@ -430,7 +943,7 @@ def generate_ticket_smart(
     hot: List[int],
     cold: List[int],
     freq: Counter,
-    last_seen: Dict[int, int],
+    occ_index: OccurrenceIndex,
     hot_share: float,
     cold_share: float,
     mix_share: float,
@@ -454,7 +967,7 @@ def generate_ticket_smart(
             hot=hot,
             cold=cold,
             freq=freq,
-            last_seen=last_seen,
+            occ_index=occ_index,
             hot_share=hot_share,
             cold_share=cold_share,
             mix_share=mix_share,
@@ -494,11 +1007,11 @@ def generate_ticket_smart(
         # Score candidate (for fallback): prefer fewer pairs + balanced + higher weight sum
         weight_sum = 0.0
         max_freq = max(freq.values()) if freq else 1
-        max_last = max([v for v in last_seen.values() if v < 10**9] + [1])
+        max_last = occ_index.max_current_gap()
         for n in ticket:
             f = freq.get(n, 0) / max_freq if max_freq else 0.0
-            ls = last_seen.get(n, 10**9)
-            overdue = 1.0 if ls >= 10**9 else min(1.0, ls / max_last if max_last else 0.0)
+            ls = occ_index.current_gap(n)
+            overdue = 1.0 if ls >= OccurrenceIndex.NEVER else min(1.0, ls / max_last if max_last else 0.0)
             weight_sum += 0.60 * (0.20 + f) + 0.40 * (0.20 + overdue)
 
         balance_penalty = abs(ev - od) * 0.15
@@ -517,13 +1030,105 @@ def generate_ticket_smart(
         hot=hot,
         cold=cold,
         freq=freq,
-        last_seen=last_seen,
+        occ_index=occ_index,
         hot_share=hot_share,
         cold_share=cold_share,
         mix_share=mix_share,
     )
 
 
+# =========================================================
+# RESULTS TABLE
+# =========================================================
+def tickets_frame(
+    tickets: List[List[int]],
+    hits: Optional[HitCheckResult] = None,
+    draws: Optional[List[Draw]] = None,
+) -> pd.DataFrame:
+    """
+    Build the results table for a whole batch in one vectorized pass
+    (same metrics as even_odd_split / count_consecutive_pairs, per row).
+    With hits (and the draws they were checked against) adds the history columns.
+    """
+    columns = ["Kupon", "Liczby", "Parzyste", "Nieparzyste", "Pary", "Suma"]
+    if not tickets:
+        return pd.DataFrame(columns=columns)
+
+    arr = np.sort(np.asarray(tickets, dtype=np.int16), axis=1)
+    even = (arr % 2 == 0).sum(axis=1)
+    pairs = (np.diff(arr, axis=1) == 1).sum(axis=1)
+
+    df = pd.DataFrame({
+        "Kupon": np.arange(1, len(arr) + 1),
+        "Liczby": [" ".join(f"{n:02d}" for n in row) for row in arr.tolist()],
+        "Parzyste": even,
+        "Nieparzyste": arr.shape[1] - even,
+        "Pary": pairs,
+        "Suma": arr.sum(axis=1),
+    })
+
+    if hits is not None and draws is not None:
+        hist = hits.histogram
+        # highest k with a non-zero count
+        df["Maks. trafień"] = hist.shape[1] - 1 - np.argmax(hist[:, ::-1] > 0, axis=1)
+        df[f"{hits.min_hits}+ trafień"] = hist[:, hits.min_hits:].sum(axis=1)
+        # draw_id of the latest draw with min_hits+ hits, empty if it never happened
+        draw_ids = np.array([d.draw_id for d in draws] + [0], dtype=np.int64)
+        last = pd.Series(draw_ids[hits.last_big_hit], dtype="Int64")
+        df[f"Ostatnio {hits.min_hits}+"] = last.mask(hits.last_big_hit < 0)
+        df["Histogram trafień"] = hist.tolist()
+
+    return df
+
+
+def render_results(df: pd.DataFrame) -> None:
+    st.markdown(f"### Wyniki ({len(df)} kuponów)")
+
+    f1, f2 = st.columns(2)
+    with f1:
+        max_pairs_shown = st.slider(
+            "Pokaż kupony z maks. liczbą par",
+            0, PICK_COUNT - 1, PICK_COUNT - 1, 1,
+            key="results_max_pairs",
+        )
+    with f2:
+        split_shown = st.selectbox(
+            "Parzyste/nieparzyste",
+            ["Wszystkie"] + [f"{e}/{PICK_COUNT - e}" for e in range(PICK_COUNT + 1)],
+            index=0,
+            key="results_split",
+        )
+
+    view = df[df["Pary"] <= max_pairs_shown]
+    if split_shown != "Wszystkie":
+        ev_shown = int(split_shown.split("/")[0])
+        view = view[view["Parzyste"] == ev_shown]
+    if len(view) != len(df):
+        st.caption(f"Po filtrach: **{len(view)}** z {len(df)}")
+
+    # st.dataframe only renders visible rows and supports sorting by header click
+    st.dataframe(
+        view,
+        hide_index=True,
+        use_container_width=True,
+        height=420,
+        column_config={
+            "Histogram trafień": st.column_config.BarChartColumn(
+                "Histogram trafień",
+                help="Ile losowań w historii dało 0, 1, 2, ... trafień",
+                y_min=0,
+            ),
+        },
+    )
+
+    st.download_button(
+        "⬇️ Pobierz wszystkie kupony (CSV)",
+        df.drop(columns=["Histogram trafień"], errors="ignore").to_csv(index=False).encode("utf-8"),
+        file_name="kupony.csv",
+        mime="text/csv",
+    )
+
+
 # =========================================================
 # STREAMLIT APP
 # =========================================================
@@ -567,7 +1172,7 @@ def main():
         st.divider()
 
         st.markdown("**Ile kuponów wygenerować?**")
-        tickets_count = st.slider("Liczba kuponów", 1, 50, 10, 1)
+        tickets_count = int(st.number_input("Liczba kuponów", 1, MAX_TICKETS_COUNT, 10, 1))
 
         st.divider()
 
@@ -630,20 +1235,43 @@ def main():
             )
             st.stop()
 
-        try:
-            with st.spinner("Czytam i analizuję wyniki z PDF..."):
-                draws = load_draws_from_local_pdf(pdf_path)
-        except Exception as e:
-            st.error(f"❌ Błąd podczas czytania PDF: {e}")
-            st.stop()
+        watcher = get_pdf_watcher(pdf_path)
+        snapshot = watcher.snapshot
+        if snapshot is None:
+            try:
+                with st.spinner("Czytam i analizuję wyniki z PDF..."):
+                    snapshot = watcher.load_now()
+            except Exception as e:
+                st.error(f"❌ Błąd podczas czytania PDF: {e}")
+                st.stop()
+        draws = snapshot.draws
 
         st.success(f"✅ Wczytano losowania: **{len(draws)}** (najświeższe: {draws[0].draw_id}, najstarsze: {draws[-1].draw_id})")
         st.markdown('<div class="mm-muted">Wyniki w PDF mogą zawierać 20 liczb na losowanie (20/80), ale generator typuje 10 liczb (10/80).</div>', unsafe_allow_html=True)
         st.markdown("</div>", unsafe_allow_html=True)
 
     # Analyze
-    freq = compute_frequency(draws)
-    last_seen = compute_last_seen(draws)
+    freq = snapshot.freq
+    occ_index = snapshot.occ_index
+
+    with st.sidebar:
+        st.divider()
+        use_ledger = st.checkbox(
+            "Nie powtarzaj wydanych kuponów",
+            value=True,
+            help=f"Każdy wygenerowany kupon trafia do wspólnego rejestru `{LEDGER_FILENAME}`; "
+                 "kupony już w nim zapisane są losowane od nowa.",
+        )
+        ledger = get_ticket_ledger(os.path.join(os.getcwd(), LEDGER_FILENAME)) if use_ledger else None
+        # Filled in after the generate block so the count includes the current batch
+        ledger_caption = st.empty()
+
+        st.caption(
+            f"Wersja danych: `{snapshot.version[:10]}` · "
+            f"wczytano {format_age(time.time() - snapshot.loaded_at)} temu"
+        )
+        if watcher.last_error:
+            st.caption(f"⚠️ Ostatnie odświeżenie PDF nie powiodło się: {watcher.last_error}")
     hot, cold = build_groups(freq, hot_size=hot_size, cold_size=cold_size)
 
     # Right panel: show groups
@@ -673,52 +1301,71 @@ def main():
 
     if generate:
         results = []
-        for _ in range(tickets_count):
-            if mode == "Inteligentny (Smart)":
-                # In smart mode, user still picks underlying base-mode behavior:
-                base_mode = st.session_state.get("smart_base_mode", "Mix (Hot+Cold)")
-                # But to keep UX simple: we map Smart to Mix unless user changes below.
-                # We'll offer a base selector here (inline) by reading from session state,
-                # but also allow default = Mix.
-                ticket = generate_ticket_smart(
-                    base_mode=base_mode,
-                    hot=hot,
-                    cold=cold,
-                    freq=freq,
-                    last_seen=last_seen,
-                    hot_share=hot_share,
-                    cold_share=cold_share,
-                    mix_share=mix_share,
-                    block_run_2=block_run_2,
-                    block_run_3=block_run_3,
-                    max_consecutive_pairs=max_pairs,
-                    even_odd_choice=even_odd_choice,
-                )
+        progress = st.progress(0.0) if tickets_count > 100 else None
+        skipped = 0
+        for i in range(tickets_count):
+            for _ in range(LEDGER_MAX_RETRIES if ledger is not None else 1):
+                if mode == "Inteligentny (Smart)":
+                    # In smart mode, user still picks underlying base-mode behavior:
+                    base_mode = st.session_state.get("smart_base_mode", "Mix (Hot+Cold)")
+                    # But to keep UX simple: we map Smart to Mix unless user changes below.
+                    # We'll offer a base selector here (inline) by reading from session state,
+                    # but also allow default = Mix.
+                    ticket = generate_ticket_smart(
+                        base_mode=base_mode,
+                        hot=hot,
+                        cold=cold,
+                        freq=freq,
+                        occ_index=occ_index,
+                        hot_share=hot_share,
+                        cold_share=cold_share,
+                        mix_share=mix_share,
+                        block_run_2=block_run_2,
+                        block_run_3=block_run_3,
+                        max_consecutive_pairs=max_pairs,
+                        even_odd_choice=even_odd_choice,
+                    )
+                else:
+                    ticket = generate_ticket_base(
+                        mode=mode,
+                        hot=hot,
+                        cold=cold,
+                        freq=freq,
+                        occ_index=occ_index,
+                        hot_share=hot_share,
+                        cold_share=cold_share,
+                        mix_share=mix_share,
+                    )
+                # Ledger on: only keep tickets nobody has been issued before
+                if ledger is None or ledger.try_issue(ticket):
+                    results.append(ticket)
+                    break
             else:
-                ticket = generate_ticket_base(
-                    mode=mode,
-                    hot=hot,
-                    cold=cold,
-                    freq=freq,
-                    last_seen=last_seen,
-                    hot_share=hot_share,
-                    cold_share=cold_share,
-                    mix_share=mix_share,
-                )
-            results.append(ticket)
-
-        # Render results
-        st.markdown("### Wyniki")
-        for i, t in enumerate(results, start=1):
-            nums = " ".join([f"{n:02d}" for n in t])
-            ev, od = even_odd_split(t)
-            pairs = count_consecutive_pairs(sorted(t))
-            st.markdown(
-                f'<div class="mm-row"><b>Kupon #{i:02d}:</b> {nums} '
-                f'<span class="mm-muted"> | parzyste/nieparzyste: {ev}/{od} | pary: {pairs}</span></div>',
-                unsafe_allow_html=True
+                skipped += 1
+            if progress is not None and (i + 1) % 100 == 0:
+                progress.progress((i + 1) / tickets_count)
+        if progress is not None:
+            progress.empty()
+        if skipped:
+            st.warning(
+                f"Pominięto {skipped} kuponów: po {LEDGER_MAX_RETRIES} próbach wciąż były już wydane wcześniej."
             )
 
+        st.session_state["results"] = results
+        st.session_state.pop("results_hits", None)
+
+    if ledger is not None:
+        ledger_caption.caption(f"Rejestr: **{ledger.count}** wydanych kuponów")
+
+    # Kept in session state so sorting/filtering the table does not drop the batch
+    if st.session_state.get("results"):
+        results = st.session_state["results"]
+        cached = st.session_state.get("results_hits")
+        if cached is None or cached[0] != snapshot.version:
+            with st.spinner("Sprawdzam kupony na całej historii losowań..."):
+                cached = (snapshot.version, hit_check(results, snapshot.packed_draws))
+            st.session_state["results_hits"] = cached
+        render_results(tickets_frame(results, hits=cached[1], draws=draws))
         st.info("Pamiętaj: to generator oparty na analizie częstości i filtrach — nie gwarantuje wygranej.")
 
     # Smart base mode selector (only visible when smart mode enabled)
@@ -748,9 +1395,13 @@ def main():
         st.write(", ".join([f"{n:02d} ({freq.get(n,0)})" for n in low15]))
 
         st.write("Liczby najbardziej 'zaległe' (dawno nie widziane w ostatnich losowaniach):")
-        # biggest last_seen index means oldest occurrence (or never)
-        overdue = sorted(range(NUM_MIN, NUM_MAX + 1), key=lambda n: last_seen.get(n, 10**9), reverse=True)[:15]
-        st.write(", ".join([f"{n:02d} (ostatnio: {last_seen.get(n,10**9)} losowań temu)" for n in overdue]))
+        # biggest current gap means oldest occurrence (or never)
+        overdue = sorted(range(NUM_MIN, NUM_MAX + 1), key=lambda n: occ_index.current_gap(n), reverse=True)[:15]
+        st.write(", ".join([
+            f"{n:02d} (ostatnio: {occ_index.current_gap(n)} losowań temu, "
+            f"śr. przerwa: {occ_index.mean_gap(n):.1f}, maks.: {occ_index.max_gap(n)})"
+            for n in overdue
+        ]))
 
 
 if __name__ == "__main__":